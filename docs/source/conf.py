@@ -6,12 +6,18 @@
 # -- Project information -----------------------------------------------------
 # https://www.sphinx-doc.org/en/master/usage/configuration.html#project-information
 
+import re
+
 from corppa import __version__
 
 project = "corppa"
 copyright = "2024,2025 Center for Digital Humanities, Princeton University"
 author = "Center for Digital Humanities RSE Team, Princeton University"
+# full version string, including any pre-release or dev suffix
 release = __version__
+# short X.Y version, which stays the same across dev and patch releases
+version_match = re.match(r"\d+\.\d+", __version__)
+version = version_match.group() if version_match else __version__
 
 # -- General configuration ---------------------------------------------------
 # https://www.sphinx-doc.org/en/master/usage/configuration.html#general-configuration
@@ -19,7 +25,6 @@ release = __version__
 extensions = [
     "sphinx.ext.autodoc",
     "sphinx.ext.intersphinx",
-    "sphinx.ext.todo",
     "sphinx.ext.coverage",
     #    "sphinx.ext.viewcode",
     "sphinx.ext.githubpages",
@@ -46,6 +51,8 @@ autodoc_mock_imports = [
 # https://www.sphinx-doc.org/en/master/usage/configuration.html#options-for-html-output
 
 html_theme = "alabaster"
+# show the short X.Y version in page titles rather than the full release
+html_title = f"{project} {version} documentation"
 html_static_path = ["_static"]
 
 html_theme_options = {
@@ -5,11 +5,14 @@
 Custom data type for poetry excerpts identified with the text of PPA pages.
 """
 
+import sys
 import types
-from copy import deepcopy
-from dataclasses import MISSING, asdict, dataclass, field, fields, replace
+from collections.abc import Iterable
+from dataclasses import MISSING, dataclass, field, fields, replace
+from functools import cache
 from typing import Any, Optional, Self, get_args, get_origin
 
+import numpy as np
 from Bio.Align import PairwiseAligner
 
 # Table of supported detection methods and their corresponding prefixes
@@ -19,9 +22,48 @@ DETECTION_METHODS = {
     "passim": "p",
     "xml": "x",
 }
+# Set of supported detection method names, for validation
+_DETECTION_METHOD_NAMES = frozenset(DETECTION_METHODS)
+
+# Aligner used by Excerpt.correct_page_excerpt; the alignment settings are
+# fixed, so the aligner is created once rather than on every call.
+# See BioPython docs for more detail on the PairwiseAligner
+# https://biopython.org/docs/dev/Tutorial/chapter_pairwise.html#sec-pairwise-aligner
+_PAGE_ALIGNER = PairwiseAligner(
+    mismatch_score=-0.5,
+    gap_score=-0.5,
+    left_deletion_score=0,  # no penalty for gaps to the left of the excerpt
+    right_deletion_score=0,  # no penlty for gaps to the right of the excerpt
+)
+
+
+def _page_span_indices(page_text: str, span_text: str) -> tuple[int, int]:
+    """
+    Returns the start and end indices of the span of the page text that best
+    aligns with the specified span text; used to correct excerpts in
+    :meth:`Excerpt.correct_page_excerpt` and :meth:`correct_page_excerpts`.
+    """
+    # If the excerpt text occurs verbatim in the page text, that is the
+    # best possible alignment, so we can skip the alignment entirely.
+    # Like the aligner, this uses the first occurrence.
+    new_start = page_text.find(span_text) if span_text else -1
+    if new_start != -1:
+        new_end = new_start + len(span_text)
+    else:
+        # List of best alignments, there can be more than one
+        results = _PAGE_ALIGNER.align(page_text, span_text)
+        # Use first resulting alignment even if there are more than one
+        alignment = results[0]
+        # Get the PPA pages aligned sequences.
+        ppa_aligned_seqs = alignment.aligned[0]
+        ## Starting index of the first aligned sequence
+        new_start = ppa_aligned_seqs[0][0]
+        ## Ending index of the final aligned sequence
+        new_end = ppa_aligned_seqs[-1][1]
+    return new_start, new_end
 
 
-@dataclass
+@dataclass(slots=True)
 class Span:
     """
     Span object representing a Pythonic "closed open" interval
@@ -62,10 +104,10 @@ class Span:
         Returns the length of overlap between this span and the other span.
         Optionally, span labels can be ignored for this calculation.
         """
-        if not self.has_overlap(other, ignore_label=ignore_label):
+        if not (ignore_label or self.label == other.label):
             return 0
-        else:
-            return min(self.end, other.end) - max(self.start, other.start)
+        overlap = min(self.end, other.end) - max(self.start, other.start)
+        return overlap if overlap > 0 else 0
 
     def overlap_factor(self, other: "Span", ignore_label: bool = False) -> float:
         """
@@ -82,7 +124,37 @@ class Span:
         corresponding to a higher degree of overlap.
         """
         overlap = self.overlap_length(other, ignore_label=ignore_label)
-        return overlap / max(len(self), len(other))
+        if not overlap:
+            return 0.0
+        return overlap / max(self.end - self.start, other.end - other.start)
+
+
+def span_overlap_factors(
+    spans_a: list[Span], spans_b: list[Span], ignore_label: bool = False
+) -> np.ndarray:
+    """
+    Returns a matrix of overlap factors (see :meth:`Span.overlap_factor`) for
+    every pair of spans from the two input lists, where entry ``[i, j]`` is the
+    overlap factor of ``spans_a[i]`` and ``spans_b[j]``. Computes all pairs at
+    once with numpy, rather than calling :meth:`Span.overlap_factor` for each
+    pair. Optionally, span labels can be ignored for this calculation.
+    """
+    starts_a = np.fromiter((span.start for span in spans_a), int, len(spans_a))
+    ends_a = np.fromiter((span.end for span in spans_a), int, len(spans_a))
+    starts_b = np.fromiter((span.start for span in spans_b), int, len(spans_b))
+    ends_b = np.fromiter((span.end for span in spans_b), int, len(spans_b))
+    # overlap length for each pair; negative values indicate no overlap
+    overlaps = np.minimum(ends_a[:, None], ends_b) - np.maximum(
+        starts_a[:, None], starts_b
+    )
+    overlaps = np.maximum(overlaps, 0)
+    if not ignore_label:
+        labels_a = np.array([span.label for span in spans_a], dtype=object)
+        labels_b = np.array([span.label for span in spans_b], dtype=object)
+        overlaps[labels_a[:, None] != labels_b] = 0
+    # length of the longer span for each pair
+    longer_lengths = np.maximum((ends_a - starts_a)[:, None], ends_b - starts_b)
+    return overlaps / longer_lengths
 
 
 def field_real_type(field_type) -> type:
@@ -111,6 +183,37 @@ def field_real_type(field_type) -> type:
     raise TypeError(f"Cannot determine real type for '{field_type}'")
 
 
+@cache
+def dataclass_fieldnames(cls, required_only: bool = False) -> tuple[str, ...]:
+    """Return the names of the fields for a dataclass, in order. Results are
+    cached per class, so that serialization methods can iterate over field
+    names without inspecting the dataclass on every call. Takes an optional
+    parameter `required_only` to return only the fields that are required
+    for initialization.
+    """
+    cls_fields = fields(cls)
+    # when requested, filter required fields based on default
+    # value and fields where init=False
+    if required_only:
+        cls_fields = tuple(
+            f
+            for f in cls_fields
+            if (f.default == MISSING and f.default_factory == MISSING and f.init)
+        )
+    return tuple(f.name for f in cls_fields)
+
+
+@cache
+def dataclass_field_types(cls) -> types.MappingProxyType[str, Any]:
+    """Return a read-only mapping of field names and corresponding types for
+    a dataclass, using :meth:`field_real_type` to determine the type for each
+    field. Like :meth:`dataclass_fieldnames`, results are cached per class.
+    """
+    return types.MappingProxyType(
+        {f.name: field_real_type(f.type) for f in fields(cls)}
+    )
+
+
 #: character to use when converting sets to and from delimited string
 MULTIVAL_DELIMITER = "; "
 
@@ -120,19 +223,17 @@ def input_to_set(input_val: list | str | set) -> set:
     when initializing :attr:`Excerpt.detection_methods` and
     :attr:`LabeledExcerpt.identification_methods`.
     """
-    # match case syntax equivalent to isinstance(input_val, list)
-    match input_val:
-        case list():  # format used by to_json
-            return set(input_val)
-        case str():  # format used by to_csv
-            return set(input_val.split(MULTIVAL_DELIMITER))
-        case set():
-            return input_val
-        case _:
-            raise ValueError(f"Unexpected value type '{type(input_val).__name__}'")
-
-
-@dataclass(kw_only=True, frozen=True)
+    # method names are a small vocabulary, so intern them to share strings
+    if isinstance(input_val, str):  # format used by to_csv
+        return set(map(sys.intern, input_val.split(MULTIVAL_DELIMITER)))
+    if isinstance(input_val, list):  # format used by to_json
+        return set(map(sys.intern, input_val))
+    if isinstance(input_val, set):
+        return input_val
+    raise ValueError(f"Unexpected value type '{type(input_val).__name__}'")
+
+
+@dataclass(kw_only=True, frozen=True, slots=True)
 class Excerpt:
     """
     A detected excerpt of poetry within a PPA page text. Excerpt objects are immutable.
@@ -162,24 +263,27 @@ class Excerpt:
         if not self.detection_methods:
             raise ValueError("Must specify at least one detection method")
 
-        # Validate detection methods
-        unsupported_methods = self.detection_methods - DETECTION_METHODS.keys()
-        if unsupported_methods:
-            error_message = "Unsupported detection method"
-            if len(unsupported_methods) == 1:
-                error_message += f": {next(iter(unsupported_methods))}"
-            else:
-                error_message += f"s: {', '.join(unsupported_methods)}"
-            raise ValueError(error_message)
-
-        # Set excerpt id
-        ## Get ID prefix
+        # Validate detection methods and determine excerpt ID prefix
         if len(self.detection_methods) == 1:
+            # Common case: a single method, validated by the prefix lookup
             [detect_name] = self.detection_methods
-            detect_pfx = DETECTION_METHODS[detect_name]
+            detect_pfx = DETECTION_METHODS.get(detect_name)
+            if detect_pfx is None:
+                raise ValueError(f"Unsupported detection method: {detect_name}")
         else:
+            # Only compute the unsupported methods when validation fails
+            if not self.detection_methods <= _DETECTION_METHOD_NAMES:
+                unsupported_methods = self.detection_methods - _DETECTION_METHOD_NAMES
+                error_message = "Unsupported detection method"
+                if len(unsupported_methods) == 1:
+                    error_message += f": {next(iter(unsupported_methods))}"
+                else:
+                    error_message += f"s: {', '.join(unsupported_methods)}"
+                raise ValueError(error_message)
             # c for combination
             detect_pfx = "c"
+
+        # Set excerpt id
         excerpt_id = f"{detect_pfx}@{self.ppa_span_start}:{self.ppa_span_end}"
         object.__setattr__(self, "excerpt_id", excerpt_id)
 
@@ -189,11 +293,12 @@ class Excerpt:
         are not included.
         """
         json_dict = {}
-        for key, value in asdict(self).items():
+        for key in dataclass_fieldnames(type(self)):
+            value = getattr(self, key)
             # Skip unset / null fields
             if value is not None:
                 # Convert sets to lists
-                if type(value) is set:
+                if value.__class__ is set:
                     json_dict[key] = list(value)
                 else:
                     json_dict[key] = value
@@ -205,10 +310,11 @@ class Excerpt:
         fields are not included.
         """
         csv_dict: dict[str, int | str] = {}
-        for key, value in asdict(self).items():
+        for key in dataclass_fieldnames(type(self)):
+            value = getattr(self, key)
             if value is not None:
                 # Convert sets to delimited string
-                if type(value) is set:
+                if value.__class__ is set:
                     # to guarantee deterministic order, sort before joining
                     csv_dict[key] = MULTIVAL_DELIMITER.join(sorted(value))
                 else:
@@ -220,23 +326,16 @@ class Excerpt:
         """Return a list of names for the fields in this class,
         in order. Takes an optional parameter `required_only` to
         return the list of fields that are required for initialization."""
-        cls_fields = fields(cls)
-        # when requested, filter required fields based on default
-        # value and fields where init=False
-        if required_only:
-            cls_fields = [
-                f
-                for f in cls_fields
-                if (f.default == MISSING and f.default_factory == MISSING and f.init)
-            ]
-
-        return [f.name for f in cls_fields]
+        # field names are cached per class; return a new list so that
+        # callers can safely modify the result
+        return list(dataclass_fieldnames(cls, required_only=required_only))
 
     @classmethod
     def field_types(cls) -> dict[str, Any]:
         """Return a dictionary of field names and corresponding types
         for this class."""
-        return {f.name: field_real_type(f.type) for f in fields(cls)}
+        # return a copy, since the cached mapping is shared
+        return dict(dataclass_field_types(cls))
 
     @classmethod
     def from_dict(cls, d: dict) -> "Excerpt":
@@ -246,27 +345,27 @@ class Excerpt:
         for set fields are converted with :meth:`input_to_set`; input
         values for integer fields support conversion from string.
         """
-        input_args = deepcopy(d)
+        # shallow copy is sufficient, since set and int fields are
+        # replaced with newly converted values rather than modified
+        input_args = dict(d)
         # Remove excerpt_id if present
         input_args.pop("excerpt_id", None)
-        cls_field_types = cls.field_types()
-        # Convert any set-type fields (i.e., detection methods)
-        set_fields = [k for k, v in cls_field_types.items() if v is set]
-        for field_name in set_fields:
-            try:
-                input_args[field_name] = input_to_set(input_args[field_name])
-            except ValueError as err:
-                raise ValueError(f"{err} for {field_name}")
-
-        # support conversion from string to integer when loading from csv
-        int_fields = [k for k, v in cls_field_types.items() if v is int]
-        for field_name in int_fields:
-            input_val = input_args.get(field_name)
-            if isinstance(input_val, str):
-                if input_val == "":
-                    del input_args[field_name]
-                else:
-                    input_args[field_name] = int(input_val)
+        # convert set and integer fields in a single pass over the fields
+        for field_name, field_type in dataclass_field_types(cls).items():
+            # Convert any set-type fields (i.e., detection methods)
+            if field_type is set:
+                try:
+                    input_args[field_name] = input_to_set(input_args[field_name])
+                except ValueError as err:
+                    raise ValueError(f"{err} for {field_name}")
+            # support conversion from string to integer when loading from csv
+            elif field_type is int:
+                input_val = input_args.get(field_name)
+                if isinstance(input_val, str):
+                    if input_val == "":
+                        del input_args[field_name]
+                    else:
+                        input_args[field_name] = int(input_val)
 
         return cls(**input_args)
 
@@ -274,14 +373,23 @@ class Excerpt:
         """
         Return a copy of this excerpt with any leading and trailing whitespace
         removed from the text and start and end indices updated to match any changes.
+        If there is no whitespace to remove, returns this (immutable) excerpt as is.
         """
-        ldiff = len(self.ppa_span_text) - len(self.ppa_span_text.lstrip())
-        rdiff = len(self.ppa_span_text) - len(self.ppa_span_text.rstrip())
+        # strip each side once, reusing the left-stripped text for the right
+        # side, and use the lengths to determine how much was removed
+        text = self.ppa_span_text
+        lstripped_text = text.lstrip()
+        stripped_text = lstripped_text.rstrip()
+        ldiff = len(text) - len(lstripped_text)
+        rdiff = len(lstripped_text) - len(stripped_text)
+        # nothing to strip; skip creating and validating a new excerpt
+        if not ldiff and not rdiff:
+            return self
         return replace(
             self,
             ppa_span_start=self.ppa_span_start + ldiff,
             ppa_span_end=self.ppa_span_end - rdiff,
-            ppa_span_text=self.ppa_span_text.strip(),
+            ppa_span_text=stripped_text,
         )
 
     def correct_page_excerpt(self, page_text: str) -> Self:
@@ -297,26 +405,7 @@ class Excerpt:
         meaningful. In the future, we may add support to guard against this
         issue.
         """
-        # TODO: Make the alignment settings more visible. However, they are
-        #       meant to be fixed values.
-        # See BioPython docs for more detail on the PairwiseAligner
-        # https://biopython.org/docs/dev/Tutorial/chapter_pairwise.html#sec-pairwise-aligner
-        aligner = PairwiseAligner(
-            mismatch_score=-0.5,
-            gap_score=-0.5,
-            query_left_gap_score=0,  # no penalty for gaps to the left of the excerpt
-            query_right_gap_score=0,  # no penlty for gaps to the right of the excerpt
-        )
-        # List of best alignments, there can be more than one
-        results = aligner.align(page_text, self.ppa_span_text)
-        # Use first resulting alignment even if there are more than one
-        alignment = results[0]
-        # Get the PPA pages aligned sequences.
-        ppa_aligned_seqs = alignment.aligned[0]
-        ## Starting index of the first aligned sequence
-        new_start = ppa_aligned_seqs[0][0]
-        ## Ending index of the final aligned sequence
-        new_end = ppa_aligned_seqs[-1][1]
+        new_start, new_end = _page_span_indices(page_text, self.ppa_span_text)
         return replace(
             self,
             ppa_span_start=new_start,
@@ -325,7 +414,7 @@ class Excerpt:
         )
 
 
-@dataclass(kw_only=True, frozen=True)
+@dataclass(kw_only=True, frozen=True, slots=True)
 class LabeledExcerpt(Excerpt):
     """
     An identified excerpt of poetry within a PPA page text.
@@ -343,7 +432,9 @@ class LabeledExcerpt(Excerpt):
 
     def __post_init__(self):
         # Run Excerpt's post initialization
-        super().__post_init__()
+        # NOTE: zero-argument super() is not supported with slots=True,
+        # since the dataclass decorator replaces the class
+        super(LabeledExcerpt, self).__post_init__()
         # Check that identification method set is not empty
         if not self.identification_methods:
             raise ValueError("Must specify at least one identification method")
@@ -360,7 +451,38 @@ class LabeledExcerpt(Excerpt):
     def from_excerpt(cls, ex: Excerpt, **kwargs: dict) -> "LabeledExcerpt":
         """Create a :class:`LabeledExcerpt` using an :class:`Excerpt` as a
         starting point and supplying data for additional fields."""
-        excerpt_info = asdict(ex)
+        excerpt_info = {}
+        for key in dataclass_fieldnames(type(ex)):
+            if key == "excerpt_id":
+                continue
+            value = getattr(ex, key)
+            # copy sets so the new excerpt does not share them with the original
+            excerpt_info[key] = set(value) if isinstance(value, set) else value
         excerpt_info.update(kwargs)
-        excerpt_info.pop("excerpt_id")
         return cls(**excerpt_info)
+
+
+def correct_page_excerpts(page_text: str, excerpts: Iterable[Excerpt]) -> list[Excerpt]:
+    """
+    Corrects a group of excerpts from the same page with
+    :meth:`Excerpt.correct_page_excerpt`, returning a list of corrected
+    excerpts in the same order. Excerpts with the same text are only aligned
+    against the page text once, which avoids repeated alignments when the same
+    page span is matched to multiple reference texts.
+    """
+    span_indices: dict[str, tuple[int, int]] = {}
+    corrected_excerpts = []
+    for excerpt in excerpts:
+        span_text = excerpt.ppa_span_text
+        if span_text not in span_indices:
+            span_indices[span_text] = _page_span_indices(page_text, span_text)
+        new_start, new_end = span_indices[span_text]
+        corrected_excerpts.append(
+            replace(
+                excerpt,
+                ppa_span_start=new_start,
+                ppa_span_end=new_end,
+                ppa_span_text=page_text[new_start:new_end],
+            )
+        )
+    return corrected_excerpts
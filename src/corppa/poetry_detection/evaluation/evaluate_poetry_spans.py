@@ -25,7 +25,7 @@ import orjsonl
 from tqdm import tqdm
 from xopen import xopen
 
-from corppa.poetry_detection.core import Span
+from corppa.poetry_detection.core import Span, span_overlap_factors
 
 
 class PageReferenceSpans:
@@ -158,20 +158,18 @@ class PageEvaluation:
         ref_to_sys: list[int | None] = [None for _ in ref_spans]
         sys_to_refs: list[list[int]] = [[] for _ in sys_spans]
 
-        # Assign each reference span to at most one system span
-        for i, ref_span in enumerate(ref_spans):
-            current_match_idx = None
-            current_match_overlap: float = 0
-            # Note: given these have an ordering this could be optimized
-            for j, sys_span in enumerate(sys_spans):
-                overlap = ref_span.overlap_factor(sys_span, ignore_label=ignore_label)
-                if overlap > current_match_overlap:
-                    current_match_idx = j
-                    current_match_overlap = overlap
+        if not ref_spans or not sys_spans:
+            return ref_to_sys, sys_to_refs
+
+        # Compute overlap factors for all reference-system span pairs at once
+        overlaps = span_overlap_factors(ref_spans, sys_spans, ignore_label=ignore_label)
+        # Assign each reference span to at most one system span; the system span
+        # with the highest overlap (argmax returns the first, in case of ties)
+        for i, j in enumerate(overlaps.argmax(axis=1).tolist()):
             # Update mappings if a match is found
-            if current_match_idx is not None:
-                ref_to_sys[i] = current_match_idx
-                sys_to_refs[current_match_idx].append(i)
+            if overlaps[i, j] > 0:
+                ref_to_sys[i] = j
+                sys_to_refs[j].append(i)
         return ref_to_sys, sys_to_refs
 
     @staticmethod
@@ -23,25 +23,68 @@ from collections.abc import Generator, Iterable
 from pathlib import Path
 from typing import Any
 
+import orjson
 import orjsonl
 from tqdm import tqdm
+from xopen import xopen
 
-from corppa.poetry_detection.core import LabeledExcerpt
+from corppa.poetry_detection.core import LabeledExcerpt, correct_page_excerpts
+
+#: Regular expression for finding a record's id in a line of JSONL without
+#: decoding the full record; only matches when ``id`` is the record's first key
+#: (as written by the text corpus builder) and has no escaped characters, so
+#: that ``id`` keys in nested objects or text are never matched
+PAGE_ID_PATTERN = re.compile(rb'\s*\{\s*"id"\s*:\s*"([^"\\]*)"\s*[,}]')
+
+#: Translation table for replacing whitespace characters with a space, matching
+#: the characters matched by ``\s`` in a regular expression (the last
+#: whitespace character in unicode is U+3000)
+WHITESPACE_TABLE = str.maketrans(
+    {char: " " for char in map(chr, range(0x3001)) if char.isspace()}
+)
 
 
 def get_page_texts(page_ids: Iterable[str], text_corpus: Path) -> dict[str, None | str]:
     """
     Gathers the texts from corpus file for the specified pages (by id), returns
-    a dictionary mapping page ids to page texts.
+    a dictionary mapping page ids to page texts. Stops reading the corpus file
+    once texts for all specified pages have been found.
     """
-    page_texts = {}
-    for page in orjsonl.stream(text_corpus):
-        page_id = page["id"]
-        if page_id in page_ids:
-            page_texts[page_id] = page.get("text", "")
+    page_ids = set(page_ids)
+    page_texts: dict[str, None | str] = {}
+    if not page_ids:
+        return page_texts
+    with xopen(text_corpus, mode="rb") as corpus_file:
+        for line in corpus_file:
+            # Check the page id before decoding the full record, so that we
+            # don't parse the text for pages that aren't needed. If the id
+            # can't be found this way, decode the record.
+            id_match = PAGE_ID_PATTERN.match(line)
+            if id_match and id_match.group(1).decode() not in page_ids:
+                continue
+            page = orjson.loads(line)
+            page_id = page["id"]
+            if page_id in page_ids:
+                page_texts[page_id] = page.get("text", "")
+                if len(page_texts) == len(page_ids):
+                    break
     return page_texts
 
 
+def get_page_ids(corpus: Path) -> Generator[str]:
+    """
+    Generates the page ids for the records in the corpus file, without
+    decoding each record's text when the id can be found in the raw line.
+    """
+    with xopen(corpus, mode="rb") as corpus_file:
+        for line in corpus_file:
+            id_match = PAGE_ID_PATTERN.match(line)
+            if id_match:
+                yield id_match.group(1).decode()
+            else:
+                yield orjson.loads(line)["id"]
+
+
 def build_passim_excerpt(
     page_id: str, span_record: dict[str, Any], ppa_page_text: None | str = None
 ) -> LabeledExcerpt:
@@ -87,8 +130,8 @@ def get_passim_span(alignment_record) -> dict[str, Any]:
         "page_end": alignment_record["end2"],
         "matches": alignment_record["matches"],
         # Note: "aligned" excerpts use "-" to indicate insertions
-        "aligned_ref_excerpt": re.sub(r"\s", " ", alignment_record["s1"]),
-        "aligned_ppa_excerpt": re.sub(r"\s", " ", alignment_record["s2"]),
+        "aligned_ref_excerpt": alignment_record["s1"].translate(WHITESPACE_TABLE),
+        "aligned_ppa_excerpt": alignment_record["s2"].translate(WHITESPACE_TABLE),
     }
     return span_record
 
@@ -98,12 +141,26 @@ def extract_passim_spans(
     disable_progress: bool = False,
 ) -> Generator[dict[str, Any]]:
     """
-    Exctracts all span-level matches identified by passim returned as a generator
+    Exctracts all span-level matches identified by passim returned as a generator.
+    Raises a ValueError immediately if the passim alignment directory does not
+    exist, rather than when the generator is first used.
     """
     align_dir = passim_dir.joinpath("align.json")
     if not align_dir.is_dir():
         raise ValueError(f"Error: Alignment directory '{align_dir}' does not exist")
-    for filepath in align_dir.glob("*.json"):
+    return _extract_alignment_spans(align_dir, disable_progress=disable_progress)
+
+
+def _extract_alignment_spans(
+    align_dir: Path,
+    disable_progress: bool = False,
+) -> Generator[dict[str, Any]]:
+    """
+    Generates span-level matches from the passim alignment files in the
+    specified alignment directory.
+    """
+    # Sort alignment files, since glob order depends on the filesystem
+    for filepath in sorted(align_dir.glob("*.json")):
         record_progress = tqdm(
             orjsonl.stream(filepath),
             desc=f"Extracting matches from {filepath.name}",
@@ -122,10 +179,8 @@ def add_excerpts(
     """
     Add original PPA and reference excerpts to the span within page results
     """
-    # For tracking page reuse by reference text
-    refs_to_pages: dict[str, dict[str, set[str]]] = defaultdict(
-        lambda: defaultdict(set)
-    )
+    # Index of poem spans by reference text (corpus id, ref id)
+    ref_spans: dict[tuple[str, str], list[dict[str, Any]]] = defaultdict(list)
 
     # Add PPA excerpts
     ppa_progress = tqdm(
@@ -135,16 +190,16 @@ def add_excerpts(
         disable=disable_progress,
     )
     for ppa_record in ppa_progress:
-        page_id = ppa_record["id"]
-        poem_spans = page_results[page_id]["poem_spans"]
+        page_record = page_results.get(ppa_record["id"])
+        if not page_record or not page_record["poem_spans"]:
+            # Skip pages without any poem spans
+            continue
         # Add PPA excerpt to each poem span
-        for span in poem_spans:
-            start, end = span["page_start"], span["page_end"]
-            span["ppa_excerpt"] = ppa_record["text"][start:end]
-            # Add the page_id to the referenced text
-            corpus_id = span["ref_corpus"]
-            ref_id = span["ref_id"]
-            refs_to_pages[corpus_id][ref_id].add(page_id)
+        text = ppa_record["text"]
+        for span in page_record["poem_spans"]:
+            span["ppa_excerpt"] = text[span["page_start"] : span["page_end"]]
+            # Add the span to the index for its referenced text
+            ref_spans[(span["ref_corpus"], span["ref_id"])].append(span)
 
     # Add reference excerpts
     for ref_corpus in ref_corpora:
@@ -154,17 +209,15 @@ def add_excerpts(
             disable=disable_progress,
         )
         for ref_record in ref_progress:
-            corpus_id = ref_record["corpus"]
-            ref_id = ref_record["id"]
-            if ref_id not in refs_to_pages[corpus_id]:
+            # Use get to avoid adding unreferenced texts to the index
+            spans = ref_spans.get((ref_record["corpus"], ref_record["id"]))
+            if not spans:
                 # Skip unreferenced texts
                 continue
-            for page_id in refs_to_pages[corpus_id][ref_id]:
-                # Add reference excerpts to corresponding spans
-                for span in page_results[page_id]["poem_spans"]:
-                    if span["ref_corpus"] == corpus_id and span["ref_id"] == ref_id:
-                        start, end = span["ref_start"], span["ref_end"]
-                        span["ref_excerpt"] = ref_record["text"][start:end]
+            # Add reference excerpts to corresponding spans
+            for span in spans:
+                start, end = span["ref_start"], span["ref_end"]
+                span["ref_excerpt"] = ref_record["text"][start:end]
 
 
 def build_passim_page_results(
@@ -175,13 +228,13 @@ def build_passim_page_results(
 ):
     # Initialize page-level results
     page_results: dict[str, dict[str, Any]] = {}
+    # Only page ids are needed here; page texts are read by add_excerpts
     page_progress = tqdm(
-        orjsonl.stream(ppa_passim_corpus),
+        get_page_ids(ppa_passim_corpus),
         desc="Initializing PPA page-level results",
         disable=disable_progress,
     )
-    for record in page_progress:
-        page_id = record["id"]
+    for page_id in page_progress:
         page_results[page_id] = {"page_id": page_id, "n_spans": 0, "poem_spans": []}
 
     # Add passage-level matches to page-level records
@@ -210,10 +263,13 @@ def write_passim_results(
     page_results = build_passim_page_results(
         ppa_passim_corpus, ref_corpora, passim_dir, disable_progress=disable_progress
     )
-    # Optionally, gather relevant original PPA page texts
+    # Optionally, gather original PPA page texts for pages with passim matches
     ppa_page_texts = {}
     if ppa_text_corpus:
-        ppa_page_texts = get_page_texts(page_results.keys(), ppa_text_corpus)
+        matched_page_ids = [
+            page_id for page_id, record in page_results.items() if record["n_spans"]
+        ]
+        ppa_page_texts = get_page_texts(matched_page_ids, ppa_text_corpus)
 
     # Write page-level & span-level output by page
     page_progress = tqdm(
@@ -222,7 +278,11 @@ def write_passim_results(
         disable=disable_progress,
     )
 
-    with open(out_span_results, mode="w", newline="") as csvfile:
+    # Open page-level output once, rather than reopening it for every page
+    with (
+        xopen(out_page_results, mode="wb") as page_file,
+        open(out_span_results, mode="w", newline="") as csvfile,
+    ):
         # Passim-specific fields
         passim_fields = ["matches", "aligned_ref_excerpt", "aligned_ppa_excerpt"]
         # Add additional passim-specific fields
@@ -232,14 +292,20 @@ def write_passim_results(
 
         for page_id, record in page_progress:
             # Write page-level results to file
-            orjsonl.append(out_page_results, record)
+            page_file.write(orjson.dumps(record))
+            page_file.write(b"\n")
 
             # Write span-level results to file
+            excerpts = [
+                build_passim_excerpt(page_id, span_record)
+                for span_record in record["poem_spans"]
+            ]
             page_text = ppa_page_texts.get(page_id)
-            for span_record in record["poem_spans"]:
-                excerpt = build_passim_excerpt(
-                    page_id, span_record, ppa_page_text=page_text
-                )
+            if page_text:
+                # Correct excerpts together if we have the original page text,
+                # since spans on the same page often share the same excerpt
+                excerpts = correct_page_excerpts(page_text, excerpts)
+            for excerpt, span_record in zip(excerpts, record["poem_spans"]):
                 row_fields = excerpt.to_csv()
                 row_fields.update({key: span_record[key] for key in passim_fields})
                 writer.writerow(row_fields)
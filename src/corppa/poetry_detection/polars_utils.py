@@ -9,7 +9,12 @@ import pathlib
 
 import polars as pl
 
-from corppa.poetry_detection.core import MULTIVAL_DELIMITER, Excerpt, LabeledExcerpt
+from corppa.poetry_detection.core import (
+    DETECTION_METHODS,
+    MULTIVAL_DELIMITER,
+    Excerpt,
+    LabeledExcerpt,
+)
 
 #: List of required fields for excerpt data
 REQ_EXCERPT_FIELDS = set(Excerpt.fieldnames(required_only=True))
@@ -26,6 +31,13 @@ FIELD_TYPES = LabeledExcerpt.field_types()
 FIELD_TYPES["detection_methods"] = pl.List
 FIELD_TYPES["identification_methods"] = pl.List
 
+#: Polars data types for excerpt fields when loading from CSV; multivalue
+#: method fields are loaded as strings and split by :meth:`fix_data_types`
+CSV_SCHEMA = {
+    field_name: {str: pl.String, int: pl.Int64, pl.List: pl.String}[ftype]
+    for field_name, ftype in FIELD_TYPES.items()
+}
+
 #: Table of included PPA work-level field names and their names for use downstream
 PPA_FIELDS = {
     "work_id": "ppa_work_id",
@@ -81,6 +93,49 @@ def fix_data_types(df):
     return df
 
 
+def excerpt_id_expr() -> pl.Expr:
+    """
+    Returns a polars expression that generates excerpt ids from the span indices
+    and detection methods (list) columns, equivalent to
+    :attr:`corppa.poetry_detection.core.Excerpt.excerpt_id`. This allows
+    generating ids for a whole DataFrame without constructing
+    :class:`~corppa.poetry_detection.core.Excerpt` objects for each row.
+    """
+    detection_methods = pl.col("detection_methods")
+    id_prefix = (
+        pl.when(detection_methods.list.n_unique() == 1)
+        .then(detection_methods.list.first().replace_strict(DETECTION_METHODS))
+        # c for combination
+        .otherwise(pl.lit("c"))
+    )
+    return pl.concat_str(
+        id_prefix,
+        pl.lit("@"),
+        pl.col("ppa_span_start"),
+        pl.lit(":"),
+        pl.col("ppa_span_end"),
+    )
+
+
+def add_excerpt_ids(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Validates detection methods and adds an ``excerpt_id`` column to a polars
+    DataFrame of excerpt data, using :meth:`excerpt_id_expr`. Expects
+    detection methods as a list column (see :meth:`fix_data_types`). Raises
+    a ValueError if any rows have no detection methods or if any unsupported
+    detection methods are present.
+    """
+    if (df["detection_methods"].list.len().fill_null(0) == 0).any():
+        raise ValueError("Must specify at least one detection method")
+    methods = df["detection_methods"].explode().drop_nulls().unique()
+    unsupported_methods = sorted(set(methods) - DETECTION_METHODS.keys())
+    if unsupported_methods:
+        raise ValueError(
+            f"Unsupported detection methods: {', '.join(unsupported_methods)}"
+        )
+    return df.with_columns(excerpt_id=excerpt_id_expr())
+
+
 def standardize_dataframe(df: pl.DataFrame) -> pl.DataFrame:
     """
     Standardizes an excerpts dataframe so that it contains exactly the columns
@@ -113,30 +168,58 @@ def extract_page_meta(excerpts_df: pl.DataFrame) -> pl.DataFrame:
     return out_df
 
 
-def load_meta_df(file: pathlib.Path, fields_table: dict[str, str]) -> pl.DataFrame:
+def scan_meta_csv(file: pathlib.Path, fields_table: dict[str, str]) -> pl.LazyFrame:
     """
-    Loads specified metadata file (``CSV``) as a polars DataFrame. The columns of the
-    resulting DataFrame are dictacted by the fields_table whose keys specify the
+    Scans specified metadata file (``CSV``) as a polars LazyFrame. The columns of the
+    resulting LazyFrame are dictacted by the fields_table whose keys specify the
     metadata fields to be selected and whose values indicate what they should be
-    renamed to.
+    renamed to. Since the file is scanned lazily, only the selected fields are
+    parsed when the LazyFrame is collected.
     """
     # Check that file exists
     if not file.is_file():
         raise ValueError(f"Input file {file} does not exist")
-    # Load in CSV
-    df = pl.read_csv(file, infer_schema=False)
+    # Scan CSV
+    lf = pl.scan_csv(file, infer_schema=False)
     # Optionally, select & rename fields
     if fields_table:
-        # Check that all required fields exist
-        missing_fields = fields_table.keys() - set(df.columns)
+        # Check that all required fields exist; only requires reading the header
+        missing_fields = fields_table.keys() - set(lf.collect_schema().names())
         if missing_fields:
             missing_str = ", ".join(sorted(missing_fields))
             raise ValueError(
                 f"Input CSV is missing the following required fields: {missing_str}"
             )
         # Select and rename fields
-        df = df.select(fields_table.keys()).rename(fields_table)
-    return df
+        lf = lf.select(fields_table.keys()).rename(fields_table)
+    return lf
+
+
+def load_meta_df(file: pathlib.Path, fields_table: dict[str, str]) -> pl.DataFrame:
+    """
+    Loads specified metadata file (``CSV``) as a polars DataFrame. The columns of the
+    resulting DataFrame are dictacted by the fields_table whose keys specify the
+    metadata fields to be selected and whose values indicate what they should be
+    renamed to. See :meth:`scan_meta_csv`.
+    """
+    return scan_meta_csv(file, fields_table).collect()
+
+
+def join_meta(
+    excerpts_df: pl.DataFrame, meta: pl.LazyFrame, on: str | list[str]
+) -> pl.DataFrame:
+    """
+    Left joins excerpt data (:class:`polars.DataFrame`) with lazily scanned
+    metadata (see :meth:`scan_meta_csv`) and returns the resulting ``DataFrame``,
+    preserving the order of the excerpts. The join is run with the polars
+    streaming engine, so the metadata is processed in batches rather than
+    loaded fully into memory first.
+    """
+    return (
+        excerpts_df.lazy()
+        .join(meta, on=on, how="left", maintain_order="left")
+        .collect(engine="streaming")
+    )
 
 
 def add_ppa_works_meta(
@@ -152,8 +235,8 @@ def add_ppa_works_meta(
         raise ValueError(
             "Missing ppa_work_id field; use extract_page_meta to extract it."
         )
-    ppa_works_meta = load_meta_df(ppa_works_csv, PPA_FIELDS)
-    return excerpts_df.join(ppa_works_meta, on="ppa_work_id", how="left")
+    ppa_works_meta = scan_meta_csv(ppa_works_csv, PPA_FIELDS)
+    return join_meta(excerpts_df, ppa_works_meta, on="ppa_work_id")
 
 
 def add_ref_poems_meta(
@@ -173,8 +256,8 @@ def add_ref_poems_meta(
         raise ValueError(
             f"Input DataFrame missing the following required fields: {missing_str}"
         )
-    poems_meta_df = load_meta_df(ref_poem_meta, POEM_FIELDS)
-    return excerpts_df.join(poems_meta_df, on=join_fields, how="left")
+    poems_meta = scan_meta_csv(ref_poem_meta, POEM_FIELDS)
+    return join_meta(excerpts_df, poems_meta, on=join_fields)
 
 
 def load_excerpts_df(
@@ -191,8 +274,9 @@ def load_excerpts_df(
 
     Currently, assume input file is a (possible compresed) `CSV` file.
     """
-    # Load input file as a polars dataframe
-    df = pl.read_csv(excerpts_file)
+    # Load input file as a polars dataframe; use known types for excerpt
+    # fields rather than inferring them from the data
+    df = pl.read_csv(excerpts_file, schema_overrides=CSV_SCHEMA)
 
     # Check that we have the required fields for either Labeled/Excerpt data
     columns = set(df.columns)
@@ -211,6 +295,9 @@ def load_excerpts_df(
 
     # Set the correct data types for excerpt fields before returning
     df = fix_data_types(df)
+    # Generate excerpt ids if they are not included in the input file
+    if "excerpt_id" not in columns:
+        df = add_excerpt_ids(df)
 
     # Optionally, add PPA work-level metadata
     if ppa_works_meta:
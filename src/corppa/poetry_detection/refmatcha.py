@@ -35,7 +35,6 @@ import logging
 import pathlib
 import re
 import sys
-from glob import iglob
 
 try:
     from itertools import batched
@@ -57,6 +56,7 @@ from corppa.poetry_detection.polars_utils import (
     LABELED_EXCERPT_FIELDS,
     fix_data_types,
 )
+from corppa.utils.build_text_corpus import read_text_records
 
 logger = logging.getLogger(__name__)
 
@@ -85,32 +85,49 @@ def compile_text(data_dir, output_file):
     directories under `data_dir`; uses the filename stem as poem identifier
     and the containing directory name as the id for the source reference corpus.
     Also looks for and includes content from `poetryfoundationdataset.csv`
-    contained in the data directory.
+    contained in the data directory. Searchable text (see
+    :meth:`generate_search_text`) is generated and included at compile time,
+    so it does not need to be regenerated each time the data is loaded.
     """
 
     # parquet file schema:
     # - poem id
     # - text of the poem
     # - source (identifier for the reference corpus)
+    # - searchable version of the text of the poem
     schema = pa.schema(
-        [("id", pa.string()), ("text", pa.string()), ("source", pa.string())]
+        [
+            ("id", pa.string()),
+            ("text", pa.string()),
+            ("source", pa.string()),
+            ("search_text", pa.string()),
+        ]
     )
     # open a parquet writer so we can add records in chunks
     pqwriter = pq.ParquetWriter(output_file, schema)
 
-    # handle files in batches
     # look for .txt files in nested directories; use parent directory name as
     # the reference corpus source name/id
-    for chunk in batched(iglob(f"{data_dir}/**/*.txt"), 1000):
-        chunk_files = [pathlib.Path(f) for f in chunk]
-        ids = [f.stem for f in chunk_files]
-        sources = [SOURCE_ID.get(f.parent.name, f.parent.name) for f in chunk_files]
-        texts = [f.open().read() for f in chunk_files]
-        # create and write a record batch
-        record_batch = pa.RecordBatch.from_arrays(
-            [ids, texts, sources], names=["id", "text", "source"]
+    text_files = sorted(pathlib.Path(data_dir).glob("**/*.txt"))
+    # records (id and text) are returned in the same order as the files;
+    # handle them in batches
+    for chunk in batched(zip(text_files, read_text_records(text_files)), 1000):
+        sources = [SOURCE_ID.get(f.parent.name, f.parent.name) for f, _ in chunk]
+        records = [record for _, record in chunk]
+        # create a dataframe for the batch and add searchable text
+        chunk_df = generate_search_text(
+            pl.DataFrame(
+                {
+                    "id": [record["id"] for record in records],
+                    "text": [record["text"] for record in records],
+                    "source": sources,
+                },
+                schema={"id": pl.String, "text": pl.String, "source": pl.String},
+            )
         )
-        pqwriter.write_batch(record_batch)
+        # convert to arrow and cast to our schema, then write out
+        for batch in chunk_df.to_arrow().cast(target_schema=schema).to_batches():
+            pqwriter.write_batch(batch)
 
     # poetry foundation text content is included in the csv file
     if POETRY_FOUNDATION_CSV.exists():
@@ -119,11 +136,13 @@ def compile_text(data_dir, output_file):
         # - add source column
         # - select only the columns we want to include
         pf_df = (
-            pl.read_csv(POETRY_FOUNDATION_CSV)
+            pl.scan_csv(POETRY_FOUNDATION_CSV)
             .rename({"Poetry Foundation ID": "id", "Content": "text"})
             .with_columns(source=pl.lit(SOURCE_ID["Poetry Foundation"]))
             .select(["id", "text", "source"])
+            .collect()
         )
+        pf_df = generate_search_text(pf_df)
         # convert polars dataframe to arrow table, cast to our schema to
         # align types (large string vs string), then write out in batches
         for batch in pf_df.to_arrow().cast(target_schema=schema).to_batches():
@@ -164,14 +183,15 @@ def compile_metadata(data_dir, output_file):
 
     # load chadwyck healey metadata
     if CHADWYCK_HEALEY_CSV.exists():
-        # use polars to read in the csv and convert to the format we want
+        # use polars to scan the csv and convert to the format we want;
+        # scanning lazily means only the columns we use are parsed
         # - rename main title to title
         # - add source id for all rows
         # - combine author first and last name
         # - reorder and limit columns to match parquet schema
         df = (
             # ignore parse errors in fields we don't care about (author_dob)
-            pl.read_csv(CHADWYCK_HEALEY_CSV, ignore_errors=True)
+            pl.scan_csv(CHADWYCK_HEALEY_CSV, ignore_errors=True)
             .rename({"title_main": "title"})
             .with_columns(source=pl.lit(SOURCE_ID["Chadwyck-Healey"]))
             .with_columns(
@@ -181,6 +201,7 @@ def compile_metadata(data_dir, output_file):
                 ).alias("author")
             )
             .select(["id", "source", "author", "title"])
+            .collect()
         )
         # convert polars dataframe to arrow table, cast to our schema to
         # align types (large string vs string), then write out in batches
@@ -215,18 +236,19 @@ def compile_metadata(data_dir, output_file):
     # load poetry foundation data from csv file
     # do this one last since it is least preferred of our sources
     if POETRY_FOUNDATION_CSV.exists():
-        # use polars to read in the csv and convert to the format we want
+        # use polars to scan the csv and convert to the format we want;
+        # scanning lazily skips parsing the poem text, which we don't need here
         # - rename columns to match desired output
         # - add source id
         # - reorder and limit columns to match parquet schema
         df = (
-            pl.read_csv(POETRY_FOUNDATION_CSV)
-            # .drop("Content", "")
+            pl.scan_csv(POETRY_FOUNDATION_CSV)
             .rename(
                 {"Author": "author", "Title": "title", "Poetry Foundation ID": "id"}
             )
             .with_columns(source=pl.lit(SOURCE_ID["Poetry Foundation"]))
             .select(["id", "source", "author", "title"])
+            .collect()
         )
         # convert polars dataframe to arrow table, cast to our schema to
         # align types (large string vs string), then write out in batches
@@ -245,6 +267,19 @@ def compile_metadata(data_dir, output_file):
 # unicode line separator; used in some internet poems text files
 LINE_SEPARATOR = "\u2028"
 
+#: single character replacements applied to text for search
+SEARCH_CHAR_REPLACEMENTS = {
+    # replace unicode line separator with newline
+    LINE_SEPARATOR: "\n",
+    # replace curly quotes with straight (both single and double)
+    "”": '"',
+    "“": '"',
+    "‘": "'",
+    "’": "'",
+    # handle long s (also handled by unidecode)
+    "ſ": "s",
+}
+
 
 def _text_for_search(expr):
     """Takes a polars expression (e.g. column or literal value) and applies
@@ -256,16 +291,11 @@ def _text_for_search(expr):
         .str.replace_all(r"(\w) \| -(\w)", "$1$2")
         # replace other punctuation with spaces
         .str.replace_all("[[:punct:]]", " ")
-        .str.replace_all(
-            LINE_SEPARATOR, "\n"
-        )  # replace unicode line separator with newline
+        # replace individual characters in a single pass
+        .str.replace_many(SEARCH_CHAR_REPLACEMENTS)
         # normalize whitespace except for newlines, so that
         # matching reference text in the output will be more readable
         .str.replace_all("[\t\v\f\r ]+", " ")  # replace all whitespace but newlines
-        # replace curly quotes with straight (both single and double)
-        .str.replace_all("[”“]", '"')
-        .str.replace_all("[‘’]", "'")
-        .str.replace_all("ſ", "s")  # handle long s (also handled by unidecode)
         .str.strip_chars()
     )
 
@@ -629,9 +659,15 @@ def process(input_file, output_file, recompile=False):
         # e.g. Chadwyck Healey poem id we have text for but not in metadata
     ).drop("id_right", "source_right")
 
-    # generate a simplified text field for searching
+    # generate a simplified text field for searching, if it was not
+    # generated when the reference data was compiled (i.e., text data
+    # compiled by an older version of this script)
     # NOTE: this part is a bit slow
-    reference_df = generate_search_text(reference_df)
+    if "search_text" not in reference_df.columns:
+        reference_df = generate_search_text(reference_df)
+    # only search text is used for matching; drop the original text
+    # so that the reference data searched for every excerpt is smaller
+    reference_df = reference_df.drop("text", "text_length")
 
     # load csv with excerpt fieldnames
     try:
@@ -1,6 +1,7 @@
 # Copyright (c) 2024-2025, Center for Digital Humanities, Princeton University
 # SPDX-License-Identifier: Apache-2.0
 
+import sys
 from dataclasses import replace
 from typing import Optional
 from unittest.mock import Mock, NonCallableMock, patch
@@ -13,8 +14,12 @@ from corppa.poetry_detection.core import (
     Excerpt,
     LabeledExcerpt,
     Span,
+    correct_page_excerpts,
+    dataclass_field_types,
+    dataclass_fieldnames,
     field_real_type,
     input_to_set,
+    span_overlap_factors,
 )
 
 
@@ -28,6 +33,13 @@ class TestSpan:
         with pytest.raises(ValueError, match=error_message):
             span = Span(2, 2, "label")
 
+    def test_slots(self):
+        # uses slots instead of a per-instance dict
+        span = Span(2, 5, "label")
+        assert not hasattr(span, "__dict__")
+        with pytest.raises(AttributeError):
+            span.extra = "value"
+
     def test_len(self):
         assert len(Span(2, 5, "label")) == 3
         assert len(Span(0, 42, "label")) == 42
@@ -89,27 +101,27 @@ class TestSpan:
             assert not span_a.is_exact_match(span_b)
             assert not span_a.is_exact_match(span_b, ignore_label=True)
 
-    @patch.object(Span, "has_overlap")
-    def test_overlap_length(self, mock_has_overlap):
+    def test_overlap_length(self):
         span_a = Span(3, 6, "label")
 
         # no overlap
-        mock_has_overlap.return_value = False
-        assert span_a.overlap_length("other span", ignore_label="bool") == 0
-        mock_has_overlap.assert_called_once_with("other span", ignore_label="bool")
+        assert span_a.overlap_length(Span(0, 3, "label")) == 0
+        assert span_a.overlap_length(Span(6, 9, "label"), ignore_label=True) == 0
+        # overlap, but different labels
+        assert span_a.overlap_length(Span(3, 6, "other")) == 0
+        assert span_a.overlap_length(Span(3, 6, "other"), ignore_label=True) == 3
 
         # has overlap
-        mock_has_overlap.reset_mock()
-        mock_has_overlap.return_value = True
         ## exact overlap
         span_b = Span(3, 6, "label")
         assert span_a.overlap_length(span_b) == 3
-        mock_has_overlap.assert_called_once_with(span_b, ignore_label=False)
         ## partial overlap
         span_b = Span(3, 5, "label")
         assert span_a.overlap_length(span_b) == 2
         span_b = Span(2, 8, "label")
         assert span_a.overlap_length(span_b) == 3
+        span_b = Span(5, 8, "label")
+        assert span_a.overlap_length(span_b) == 1
 
     @patch.object(Span, "overlap_length")
     def test_overlap_factor(self, mock_overlap_length):
@@ -313,6 +325,9 @@ class TestExcerpt:
         csv_dict["ppa_span_start"] = "0"
         csv_dict["ppa_span_end"] = "1"
         assert Excerpt.from_dict(csv_dict) == excerpt
+        # input dictionary is not modified
+        assert csv_dict["ppa_span_start"] == "0"
+        assert csv_dict["excerpt_id"] == excerpt.excerpt_id
 
         # Error if detection_methods field has bad type
         bad_dict = csv_dict | {"detection_methods": 0}
@@ -337,6 +352,8 @@ class TestExcerpt:
             detection_methods={"manual"},
         )
         assert excerpt.strip_whitespace() == expected_result
+        # no changes needed, so the same excerpt is returned
+        assert excerpt.strip_whitespace() is excerpt
 
         # Leading whitespace
         excerpt = Excerpt(
@@ -389,8 +406,8 @@ class TestExcerpt:
         )
         assert excerpt.strip_whitespace() == expected_result
 
-    @patch("corppa.poetry_detection.core.PairwiseAligner")
-    def test_page_excerpt(self, mock_pairwise_aligner):
+    @patch("corppa.poetry_detection.core._PAGE_ALIGNER")
+    def test_page_excerpt(self, mock_aligner):
         # Setup mocks.
         # There are many mocked objects because of how alignment works in BioPython.
         # See the BioPython docs for more detail:
@@ -406,10 +423,8 @@ class TestExcerpt:
                 [[0, 2], [3, 4], [5, 8]],
             ]
         )
-        ## Mock aligner object
-        mock_aligner = NonCallableMock()
+        ## Mock aligner alignment results
         mock_aligner.align = Mock(return_value=[mock_alignment])
-        mock_pairwise_aligner.return_value = mock_aligner
 
         page_text = "page_text hello"
         excerpt = Excerpt(
@@ -420,12 +435,6 @@ class TestExcerpt:
             detection_methods={"xml"},
         )
         result = excerpt.correct_page_excerpt(page_text)
-        mock_pairwise_aligner.assert_called_once_with(
-            mismatch_score=-0.5,
-            gap_score=-0.5,
-            query_left_gap_score=0,
-            query_right_gap_score=0,
-        )
         mock_aligner.align.assert_called_once_with("page_text hello", "excerpt_text")
         # Check result
         expected_result = Excerpt(
@@ -437,6 +446,29 @@ class TestExcerpt:
         )
         assert result == expected_result
 
+    @patch("corppa.poetry_detection.core._PAGE_ALIGNER")
+    def test_page_excerpt_exact_match(self, mock_aligner):
+        page_text = "page_text hello hello"
+        excerpt = Excerpt(
+            page_id="page_id",
+            ppa_span_start=0,
+            ppa_span_end=5,
+            ppa_span_text="hello",
+            detection_methods={"xml"},
+        )
+        result = excerpt.correct_page_excerpt(page_text)
+        # exact match does not require alignment
+        mock_aligner.align.assert_not_called()
+        # uses the first occurrence
+        expected_result = Excerpt(
+            page_id="page_id",
+            ppa_span_start=10,
+            ppa_span_end=15,
+            ppa_span_text="hello",
+            detection_methods={"xml"},
+        )
+        assert result == expected_result
+
     def test_page_excerpt_example(self):
         # Example page: CB0126086107.0218
         ppa_text = "CHAP. XIII. ORATIONS AND HARANGUES.\n185\nSecure this, and you fecure every thing. Lofe this, and all\nis loft.\nPRICE.\nCHA P. XIII.\nTHE SPEECH OF BRUTUS ON THE DEATH\nR\nOF CÆSAR.\nOMANS, countrymen, and lovers! hear me for my\ncaufe; and be filent, that you may hear. Believe me\nfor mine honour, and have refpect to mine honour, that you\nmay believe. Cenfure me in your wifdom, and awake your\nfenfes, that you may the better judge.\nin\nIf there be any\nthis affembly, any dear friend of Cæfar's, to him I ſay, that\nBrutus's love to Cæfar was no leſs than his.\nit\nIf then that\nfriend demand, why Brutus rofe againſt Cæfar, this is my\nanfwer: Not that I loved Cæfar lefs, but that I loved Rome\nmore. Had you rather Cæfar were living, and die all flaves;\nthan that Cæfar were dead, to live all freemen? As Cæfar\nloved me, I weep for him; as he was fortunate, I rejoiceat\ni as he was valiant, I honour him; but as he was ambiti-\nI flew him. There are tears for his love, joy for his\nfortune, honour for his valour, and death for his ambition.\nWho's here fo bafe, that would be a bond-man? If any,\nfpeak; for him have I offended. Who's here fo rude, \"that\nwould not be a Roman? If any, ſpeak; for him have I of-\nfended. Who's here fo vile, that will not love his country?\nI paufe for a\nIf any, fpeak; for him have I offended.-\nous,\nreply.\nNONE ?\nthen none have I offended I have done no\nmore"
@@ -458,6 +490,12 @@ class TestExcerpt:
         result = excerpt.correct_page_excerpt(ppa_text)
         assert result == expected_result
 
+    def test_fieldnames_cached(self):
+        # results are cached, but each call returns a new list
+        fieldnames = Excerpt.fieldnames()
+        fieldnames.append("extra")
+        assert "extra" not in Excerpt.fieldnames()
+
     def test_fieldnames_required(self):
         req_fieldnames = Excerpt.fieldnames(required_only=True)
         assert req_fieldnames == [
@@ -479,6 +517,9 @@ class TestExcerpt:
             "notes": str,
             "excerpt_id": str,
         }
+        # returns a copy, so changes do not affect later calls
+        field_types["detection_methods"] = list
+        assert Excerpt.field_types()["detection_methods"] is set
 
 
 class TestLabeledExcerpt:
@@ -674,6 +715,22 @@ class TestLabeledExcerpt:
         # (caching the method breaks this)
         assert LabeledExcerpt.field_types() != Excerpt.field_types()
 
+    def test_slots(self):
+        excerpt = LabeledExcerpt(
+            page_id="page_id",
+            ppa_span_start=0,
+            ppa_span_end=1,
+            ppa_span_text="page_text",
+            poem_id="poem_id",
+            ref_corpus="corpus_id",
+            detection_methods={"manual"},
+            identification_methods={"id"},
+        )
+        # uses slots instead of a per-instance dict
+        assert not hasattr(excerpt, "__dict__")
+        # excerpt id is still set on initialization
+        assert excerpt.excerpt_id == "m@0:1"
+
     def test_from_excerpt(self):
         excerpt = Excerpt(
             page_id="page_id",
@@ -694,6 +751,9 @@ class TestLabeledExcerpt:
         assert labeled_ex.excerpt_id == excerpt.excerpt_id
         assert labeled_ex.poem_id == "Z1234"
         assert labeled_ex.ref_corpus == "test-corpus"
+        # set fields are copied, not shared with the original excerpt
+        assert labeled_ex.detection_methods == excerpt.detection_methods
+        assert labeled_ex.detection_methods is not excerpt.detection_methods
 
         # should be able to override fields
         labeled_ex = LabeledExcerpt.from_excerpt(
@@ -723,6 +783,47 @@ def test_field_real_type():
         field_real_type("text content")
 
 
+def test_span_overlap_factors():
+    spans_a = [Span(2, 5, "a"), Span(10, 15, "b")]
+    spans_b = [Span(1, 6, "a"), Span(11, 13, "c"), Span(20, 30, "a")]
+    # matches the overlap factor for each pair of spans
+    for ignore_label in [False, True]:
+        result = span_overlap_factors(spans_a, spans_b, ignore_label=ignore_label)
+        assert result.shape == (2, 3)
+        for i, span_a in enumerate(spans_a):
+            for j, span_b in enumerate(spans_b):
+                assert result[i, j] == span_a.overlap_factor(
+                    span_b, ignore_label=ignore_label
+                )
+    # spot check values
+    result = span_overlap_factors(spans_a, spans_b)
+    assert result[0, 0] == 0.6
+    assert result[1, 1] == 0
+    result = span_overlap_factors(spans_a, spans_b, ignore_label=True)
+    assert result[1, 1] == 0.4
+
+
+def test_dataclass_fieldnames():
+    assert dataclass_fieldnames(Excerpt) == tuple(Excerpt.fieldnames())
+    assert dataclass_fieldnames(LabeledExcerpt) == tuple(LabeledExcerpt.fieldnames())
+    # cached per class, so subclass results should not match the parent class
+    assert dataclass_fieldnames(LabeledExcerpt) != dataclass_fieldnames(Excerpt)
+    assert dataclass_fieldnames(Excerpt, required_only=True) == tuple(
+        Excerpt.fieldnames(required_only=True)
+    )
+
+
+def test_dataclass_field_types():
+    assert dataclass_field_types(Excerpt) == Excerpt.field_types()
+    assert dataclass_field_types(LabeledExcerpt) == LabeledExcerpt.field_types()
+    # cached per class
+    assert dataclass_field_types(Excerpt) is dataclass_field_types(Excerpt)
+    assert dataclass_field_types(LabeledExcerpt) != dataclass_field_types(Excerpt)
+    # cached mapping is read-only
+    with pytest.raises(TypeError):
+        dataclass_field_types(Excerpt)["notes"] = int
+
+
 def test_input_to_set():
     # string, single value
     assert input_to_set("a") == {"a"}
@@ -732,6 +833,47 @@ def test_input_to_set():
     assert input_to_set(["a", "b", "c"]) == {"a", "b", "c"}
     # set
     assert input_to_set({"a", "b", "c"}) == {"a", "b", "c"}
+    # values from strings and lists are interned
+    method = "".join(["pas", "sim"])
+    assert method is not sys.intern("passim")
+    assert input_to_set(method).pop() is sys.intern("passim")
+    assert input_to_set([method]).pop() is sys.intern("passim")
     # unsupported input
     with pytest.raises(ValueError, match="Unexpected value type 'int'"):
         input_to_set(1)
+
+
+@patch("corppa.poetry_detection.core._PAGE_ALIGNER")
+def test_correct_page_excerpts(mock_aligner):
+    ## Mock resulting alignment object (see TestExcerpt.test_page_excerpt)
+    mock_alignment = NonCallableMock()
+    mock_alignment.aligned = np.array([[[10, 15]], [[0, 5]]])
+    mock_aligner.align = Mock(return_value=[mock_alignment])
+
+    page_text = "page_text hello"
+    excerpt_a = Excerpt(
+        page_id="page_id",
+        ppa_span_start=0,
+        ppa_span_end=5,
+        ppa_span_text="hallo",
+        detection_methods={"passim"},
+    )
+    # same excerpt text matched to a different reference
+    excerpt_b = LabeledExcerpt.from_excerpt(
+        excerpt_a, poem_id="poem", ref_corpus="ref", identification_methods={"passim"}
+    )
+    # excerpt text occurs exactly in the page text
+    excerpt_c = replace(excerpt_a, ppa_span_text="page", ppa_span_end=4)
+
+    results = correct_page_excerpts(page_text, [excerpt_a, excerpt_b, excerpt_c])
+    # excerpts with the same text are only aligned once
+    mock_aligner.align.assert_called_once_with(page_text, "hallo")
+    assert results == [
+        replace(excerpt_a, ppa_span_start=10, ppa_span_end=15, ppa_span_text="hello"),
+        replace(excerpt_b, ppa_span_start=10, ppa_span_end=15, ppa_span_text="hello"),
+        replace(excerpt_c, ppa_span_start=0, ppa_span_end=4, ppa_span_text="page"),
+    ]
+    # results match correcting each excerpt individually
+    assert results == [
+        ex.correct_page_excerpt(page_text) for ex in [excerpt_a, excerpt_b, excerpt_c]
+    ]
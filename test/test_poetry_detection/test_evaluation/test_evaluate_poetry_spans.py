@@ -200,6 +200,12 @@ class TestPageEvaluation:
         assert results[0] == [0, 0, 0]
         assert results[1] == [[0, 1, 2]]
 
+        # No reference or no system spans
+        results = PageEvaluation._get_span_mappings([], sys_spans, False)
+        assert results == ([], [[]])
+        results = PageEvaluation._get_span_mappings(ref_spans, [], False)
+        assert results == ([None, None, None], [])
+
     def test_get_span_pairs(self):
         # Simple 1-1 case
         ref_spans = ["a", "b", "c"]
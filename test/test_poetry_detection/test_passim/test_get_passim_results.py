@@ -1,9 +1,12 @@
 # Copyright (c) 2024-2025, Center for Digital Humanities, Princeton University
 # SPDX-License-Identifier: Apache-2.0
 
+import csv
 import pathlib
 from unittest.mock import call, patch
 
+import orjson
+import orjsonl
 import pytest
 
 from corppa.poetry_detection.core import LabeledExcerpt
@@ -11,24 +14,82 @@ from corppa.poetry_detection.passim.get_passim_results import (
     add_excerpts,
     build_passim_excerpt,
     extract_passim_spans,
+    get_page_ids,
     get_page_texts,
     get_passim_span,
+    write_passim_results,
 )
 
 
-@patch("corppa.poetry_detection.passim.get_passim_results.orjsonl")
-def test_get_page_texts(mock_orjsonl):
+def test_get_page_texts(tmp_path):
     # Setup corpus data
     jsonl_data = [
         {"id": "a", "text": "1"},
         {"id": "b", "text": "2"},
         {"id": "c", "text": "3"},
     ]
-    mock_orjsonl.stream.return_value = jsonl_data
+    text_corpus = tmp_path / "ppa.jsonl"
+    orjsonl.save(text_corpus, jsonl_data)
 
     expected_results = {"a": "1", "c": "3"}
-    assert get_page_texts({"a", "c", "z"}, "input jsonl") == expected_results
-    mock_orjsonl.stream.assert_called_once_with("input jsonl")
+    assert get_page_texts({"a", "c", "z"}, text_corpus) == expected_results
+
+    # compressed corpus
+    text_corpus_gz = tmp_path / "ppa.jsonl.gz"
+    orjsonl.save(text_corpus_gz, jsonl_data)
+    assert get_page_texts({"a", "c", "z"}, text_corpus_gz) == expected_results
+
+    # only records for requested pages are decoded; stops reading the
+    # corpus once all pages are found
+    with patch(
+        "corppa.poetry_detection.passim.get_passim_results.orjson.loads",
+        side_effect=orjson.loads,
+    ) as mock_loads:
+        assert get_page_texts(["b"], text_corpus) == {"b": "2"}
+        mock_loads.assert_called_once_with(b'{"id":"b","text":"2"}\n')
+
+    # records where the id can't be found without decoding are still checked
+    text_corpus.write_text('{"text": "4", "id" : "d"}\n')
+    assert get_page_texts(["d"], text_corpus) == {"d": "4"}
+    # id keys in nested objects are not mistaken for the record id
+    text_corpus.write_text('{"meta": {"id": "x"}, "id": "d", "text": "4"}\n')
+    assert get_page_texts(["d"], text_corpus) == {"d": "4"}
+
+    # corpus is not read when there are no pages to find
+    missing_corpus = tmp_path / "missing.jsonl"
+    assert get_page_texts([], missing_corpus) == {}
+
+
+def test_get_page_ids(tmp_path):
+    corpus = tmp_path / "ppa_passim.jsonl"
+    orjsonl.save(
+        corpus,
+        [
+            {"id": "a", "corpus": "ppa", "text": 'with "id": "b" in text'},
+            {"id": "c", "corpus": "ppa", "text": "2"},
+        ],
+    )
+    assert list(get_page_ids(corpus)) == ["a", "c"]
+
+    # ids are found without decoding records
+    with patch(
+        "corppa.poetry_detection.passim.get_passim_results.orjson.loads"
+    ) as mock_loads:
+        assert list(get_page_ids(corpus)) == ["a", "c"]
+        mock_loads.assert_not_called()
+
+    # records where the id can't be found without decoding are decoded
+    corpus.write_text('{"text": "1", "id" : "d"}\n{"id": "e\\"f", "text": ""}\n')
+    assert list(get_page_ids(corpus)) == ["d", 'e"f']
+
+    # id keys in nested objects are not mistaken for the record id
+    corpus.write_text('{"meta": {"id": "x"}, "id": "g", "text": ""}\n')
+    assert list(get_page_ids(corpus)) == ["g"]
+
+    # compressed corpus
+    corpus_gz = tmp_path / "ppa_passim.jsonl.gz"
+    orjsonl.save(corpus_gz, [{"id": "a", "text": "1"}])
+    assert list(get_page_ids(corpus_gz)) == ["a"]
 
 
 @patch.object(LabeledExcerpt, "correct_page_excerpt")
@@ -92,6 +153,10 @@ def test_get_passim_span():
         "aligned_ref_excerpt": "Aligned text with dashes",
         "aligned_ppa_excerpt": "Aligned text with ------",
     }
+    # unicode whitespace is also replaced, as with the regular expression \s
+    passim_record["s1"] = "Aligned\u00a0text\u2028with\u3000dashes"
+    span = get_passim_span(passim_record)
+    assert span["aligned_ref_excerpt"] == "Aligned text with dashes"
 
 
 @patch("corppa.poetry_detection.passim.get_passim_results.get_passim_span")
@@ -118,7 +183,7 @@ def test_extract_passim_spans(mock_orjsonl, mock_get_span, tmp_path):
         f"Error: Alignment directory '{align_dir}/align.json' does not exist"
     )
     with pytest.raises(ValueError, match=error_message):
-        _ = list(extract_passim_spans(align_dir, disable_progress=True))
+        extract_passim_spans(align_dir, disable_progress=True)
     mock_orjsonl.assert_not_called()
     mock_get_span.assert_not_called()
 
@@ -175,7 +240,13 @@ def test_add_excerpts(mock_orjsonl):
         "page_c": {"poem_spans": []},
     }
 
-    ppa_corpus = [{"id": "a", "text": "text"}, {"id": "b", "text": "hello world!"}]
+    ppa_corpus = [
+        {"id": "a", "text": "text"},
+        {"id": "b", "text": "hello world!"},
+        # pages without spans are skipped
+        {"id": "page_c", "text": "no spans"},
+        {"id": "page_d", "text": "not in results"},
+    ]
     r1_corpus = [
         {"id": "poem_a", "corpus": "r1", "text": "abcdefghijklmnop"},
         {"id": "poem_b", "corpus": "r1", "text": "poetry"},
@@ -246,3 +317,45 @@ def test_add_excerpts(mock_orjsonl):
         "page_c": {"poem_spans": []},
     }
     assert page_results == expected_results
+
+
+@patch("corppa.poetry_detection.passim.get_passim_results.build_passim_page_results")
+def test_write_passim_results(mock_build_page_results, tmp_path):
+    span_record = {
+        "ref_id": "poem_a",
+        "ref_corpus": "ref",
+        "ref_start": 0,
+        "ref_end": 1,
+        "ref_excerpt": "B",
+        "page_start": 1,
+        "page_end": 2,
+        "ppa_excerpt": "b",
+        "matches": 1,
+        "aligned_ref_excerpt": "B",
+        "aligned_ppa_excerpt": "b",
+    }
+    page_results = {
+        "a": {"page_id": "a", "n_spans": 1, "poem_spans": [span_record]},
+        "b": {"page_id": "b", "n_spans": 0, "poem_spans": []},
+    }
+    mock_build_page_results.return_value = page_results
+    out_page_results = tmp_path / "pages.jsonl"
+    out_span_results = tmp_path / "spans.csv"
+
+    write_passim_results(
+        "ppa_passim_corpus",
+        ["ref_corpus"],
+        "passim_dir",
+        out_page_results,
+        out_span_results,
+        disable_progress=True,
+    )
+    # one page-level record per page
+    assert orjsonl.load(out_page_results) == list(page_results.values())
+    # one span-level row per span
+    with out_span_results.open(newline="") as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    assert len(rows) == 1
+    assert rows[0]["page_id"] == "a"
+    assert rows[0]["poem_id"] == "poem_a"
+    assert rows[0]["matches"] == "1"
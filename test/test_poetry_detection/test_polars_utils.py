@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import csv
+from dataclasses import replace
 from unittest.mock import patch
 
 import polars as pl
@@ -11,13 +12,16 @@ from corppa.poetry_detection.core import MULTIVAL_DELIMITER, Excerpt, LabeledExc
 from corppa.poetry_detection.polars_utils import (
     POEM_FIELDS,
     PPA_FIELDS,
+    add_excerpt_ids,
     add_ppa_works_meta,
     add_ref_poems_meta,
+    excerpt_id_expr,
     extract_page_meta,
     fix_data_types,
     has_poem_ids,
     load_excerpts_df,
     load_meta_df,
+    scan_meta_csv,
 )
 
 excerpt1 = Excerpt(
@@ -143,6 +147,13 @@ def test_load_excerpts_df(mock_add_ppa_meta, mock_add_poem_meta, tmp_path):
     assert loaded_df.row(0, named=True) == excerpt1.to_dict()
     # set field has been loaded correctly as a list
     assert loaded_df.schema["detection_methods"] == pl.List
+    # integer fields are loaded with the expected type
+    assert loaded_df.schema["ppa_span_start"] == pl.Int64
+    # text fields are loaded as strings, even when content looks numeric
+    pl.DataFrame([replace(excerpt1, ppa_span_text="123").to_csv()]).write_csv(datafile)
+    loaded_df = load_excerpts_df(datafile)
+    assert loaded_df.schema["ppa_span_text"] == pl.String
+    assert loaded_df["ppa_span_text"].to_list() == ["123"]
     # valid labeled excerpt data
     _excerpts_to_csv(datafile, [excerpt1_label1, excerpt2_label1])
     loaded_df = load_excerpts_df(datafile)
@@ -184,6 +195,11 @@ def test_load_excerpts_df(mock_add_ppa_meta, mock_add_poem_meta, tmp_path):
     with pytest.raises(ValueError, match="missing required excerpt fields"):
         load_excerpts_df(datafile)
 
+    # excerpt ids are generated when not included in the input file
+    pl.DataFrame([excerpt1.to_csv()]).drop("excerpt_id").write_csv(datafile)
+    loaded_df = load_excerpts_df(datafile)
+    assert loaded_df["excerpt_id"].to_list() == [excerpt1.excerpt_id]
+
     # invalid - looks like labeled excerpt data but missing a field
     with datafile.open("w", encoding="utf-8") as filehandle:
         csv_writer = csv.writer(filehandle)
@@ -194,6 +210,45 @@ def test_load_excerpts_df(mock_add_ppa_meta, mock_add_poem_meta, tmp_path):
         load_excerpts_df(datafile)
 
 
+def test_excerpt_id_expr():
+    excerpt3 = Excerpt(
+        page_id="p.2",
+        ppa_span_start=3,
+        ppa_span_end=8,
+        ppa_span_text="more text",
+        detection_methods={"manual", "passim"},
+    )
+    excerpts = [excerpt1, excerpt2, excerpt3]
+    df = pl.DataFrame([ex.to_dict() for ex in excerpts])
+    result = df.select(excerpt_id=excerpt_id_expr())
+    # generated ids should match those generated by the Excerpt class
+    assert result["excerpt_id"].to_list() == [ex.excerpt_id for ex in excerpts]
+
+
+def test_add_excerpt_ids():
+    df = pl.DataFrame([excerpt1.to_dict(), excerpt2.to_dict()]).drop("excerpt_id")
+    result = add_excerpt_ids(df)
+    assert result["excerpt_id"].to_list() == [
+        excerpt1.excerpt_id,
+        excerpt2.excerpt_id,
+    ]
+
+    # unsupported detection methods
+    df = df.with_columns(detection_methods=pl.lit(["manual", "unknown"]))
+    with pytest.raises(ValueError, match="Unsupported detection methods: unknown"):
+        add_excerpt_ids(df)
+
+    # missing detection methods: null or empty list
+    for methods in [None, []]:
+        df = df.with_columns(
+            detection_methods=pl.Series([["manual"], methods], dtype=pl.List(pl.String))
+        )
+        with pytest.raises(
+            ValueError, match="Must specify at least one detection method"
+        ):
+            add_excerpt_ids(df)
+
+
 def test_extract_page_meta():
     ppa_page_ids = ["A01224.100", "yale.39002088447587.00000050", "CW0111540239.0092"]
     excerpts_df = pl.DataFrame(
@@ -270,6 +325,10 @@ def test_load_meta_df(tmp_path):
         row_dict = {v: row[k] for k, v in PPA_FIELDS.items()}
         assert result_df.row(i, named=True) == row_dict
 
+    # Without fields table, all fields are loaded
+    result_df = load_meta_df(ppa_meta, {})
+    assert result_df.columns == csv_fields
+
     # Error Case: Input file does not exist
     missing_csv = tmp_path / "missing.csv"
     with pytest.raises(ValueError, match=f"Input file {missing_csv} does not exist"):
@@ -292,8 +351,20 @@ def test_load_meta_df(tmp_path):
             load_meta_df(bad_csv, PPA_FIELDS)
 
 
-@patch("corppa.poetry_detection.polars_utils.load_meta_df")
-def test_add_ppa_works_meta(mock_load_meta_df):
+def test_scan_meta_csv(tmp_path):
+    ppa_meta = tmp_path / "ppa_meta.csv"
+    ppa_meta.write_text("work_id,title,extra\nwork_a,title_a,unused\n")
+    result = scan_meta_csv(ppa_meta, {"work_id": "ppa_work_id", "title": "title"})
+    assert isinstance(result, pl.LazyFrame)
+    assert result.collect_schema().names() == ["ppa_work_id", "title"]
+    assert result.collect().row(0) == ("work_a", "title_a")
+    # missing fields are reported without collecting
+    with pytest.raises(ValueError, match="missing the following required fields: year"):
+        scan_meta_csv(ppa_meta, {"work_id": "ppa_work_id", "year": "year"})
+
+
+@patch("corppa.poetry_detection.polars_utils.scan_meta_csv")
+def test_add_ppa_works_meta(mock_scan_meta_csv):
     # Construct test inputs
     excerpts_df = pl.DataFrame(
         [
@@ -325,10 +396,10 @@ def test_add_ppa_works_meta(mock_load_meta_df):
         )
     ppa_meta_df = pl.DataFrame(ppa_meta_rows)
     # Set-up mock object
-    mock_load_meta_df.return_value = ppa_meta_df
+    mock_scan_meta_csv.return_value = ppa_meta_df.lazy()
 
     results = add_ppa_works_meta(excerpts_df, "ppa_meta")
-    mock_load_meta_df.assert_called_once_with("ppa_meta", PPA_FIELDS)
+    mock_scan_meta_csv.assert_called_once_with("ppa_meta", PPA_FIELDS)
     # Check columns
     assert set(results.columns) == set(excerpts_df.columns) | set(ppa_meta_df.columns)
     # Check row contents
@@ -344,16 +415,16 @@ def test_add_ppa_works_meta(mock_load_meta_df):
     )
 
     # Error case: missing `ppa_work_id` field
-    mock_load_meta_df.reset_mock()
+    mock_scan_meta_csv.reset_mock()
     err_msg = "Missing ppa_work_id field; use extract_page_meta to extract it."
     with pytest.raises(ValueError, match=err_msg):
         bad_df = pl.DataFrame([{"excerpt_id": "a"}, {"excerpt_id": "b"}])
         add_ppa_works_meta(bad_df, "ppa_meta")
-    mock_load_meta_df.assert_not_called()
+    mock_scan_meta_csv.assert_not_called()
 
 
-@patch("corppa.poetry_detection.polars_utils.load_meta_df")
-def test_add_poems_meta(mock_load_meta_df):
+@patch("corppa.poetry_detection.polars_utils.scan_meta_csv")
+def test_add_poems_meta(mock_scan_meta_csv):
     # Construct test inputs
     excerpts_df = pl.DataFrame(
         [
@@ -406,10 +477,10 @@ def test_add_poems_meta(mock_load_meta_df):
 
     poem_meta_df = pl.DataFrame(poem_meta_rows)
     # Set-up mock object
-    mock_load_meta_df.return_value = poem_meta_df
+    mock_scan_meta_csv.return_value = poem_meta_df.lazy()
 
     results = add_ref_poems_meta(excerpts_df, "poem_meta")
-    mock_load_meta_df.assert_called_once_with("poem_meta", POEM_FIELDS)
+    mock_scan_meta_csv.assert_called_once_with("poem_meta", POEM_FIELDS)
     # Check columns
     assert set(results.columns) == set(excerpts_df.columns) | set(poem_meta_df.columns)
     # Check row contents
@@ -426,7 +497,7 @@ def test_add_poems_meta(mock_load_meta_df):
 
     # Error case: missing required fields
     for missing_fields in [["poem_id"], ["ref_corpus"], ["poem_id", "ref_corpus"]]:
-        mock_load_meta_df.reset_mock()
+        mock_scan_meta_csv.reset_mock()
         # Construct bad input dataframe
         ## Add fields that aren't missing
         bad_rows = [{"excerpt_id": "a"}, {"excerpt_id": "b"}]
@@ -439,4 +510,4 @@ def test_add_poems_meta(mock_load_meta_df):
         err_msg += ", ".join(missing_fields)
         with pytest.raises(ValueError, match=err_msg):
             add_ref_poems_meta(bad_df, "poem_meta")
-        mock_load_meta_df.assert_not_called()
+        mock_scan_meta_csv.assert_not_called()
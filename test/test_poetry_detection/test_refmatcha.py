@@ -49,6 +49,8 @@ His might and deprecate his power""",
     ),
     # remove regex characters
     ("* The earth is the Lord's", "The earth is the Lords"),
+    # straighten curly quotes; convert unicode line separator to newline
+    ("“Tis ‘here’\u2028now”", "\"Tis 'here'\nnow\""),
 ]
 
 
@@ -363,6 +365,8 @@ def test_compile_text(
     text_df = pl.read_parquet(text_file)
     # we expect three rows based on fixture data
     assert text_df.height == 3
+    # searchable text is generated at compile time
+    assert text_df.columns == ["id", "text", "source", "search_text"]
     # sort so test order is reliable
     text_df = text_df.sort(pl.col("source"))
     text_row = text_df.row(0, named=True)
@@ -377,6 +381,7 @@ def test_compile_text(
     assert text_row["id"] == "55489"
     assert text_row["text"].startswith("Dear Writers, I’m compiling")
     assert text_row["source"] == "poetry-foundation"
+    assert text_row["search_text"].startswith("Dear Writers I'm compiling")
 
     # should get a warning if poetry foundation csv is missing
     poetry_foundation_csv.unlink()
@@ -1,15 +1,18 @@
 # Copyright (c) 2024-2025, Center for Digital Humanities, Princeton University
 # SPDX-License-Identifier: Apache-2.0
 
+import gzip
 from inspect import isgenerator
 from pathlib import Path
 from unittest.mock import call, patch
 
+import orjsonl
 import pytest
 
 from corppa.utils.build_text_corpus import (
     build_text_corpus,
     get_text_record,
+    read_text_records,
     save_text_corpus,
 )
 
@@ -23,6 +26,20 @@ def test_get_text_record(tmp_path):
     assert result == expected_result
 
 
+def test_read_text_records(tmp_path):
+    text_files = []
+    for i in range(10):
+        text_file = tmp_path / f"{i}.txt"
+        text_file.write_text(f"text {i}", encoding="utf-8")
+        text_files.append(text_file)
+
+    results = read_text_records(iter(text_files), max_workers=3, max_pending=2)
+    assert isgenerator(results)
+    # records are returned in the same order as the input files
+    assert list(results) == [{"id": f"{i}", "text": f"text {i}"} for i in range(10)]
+    assert list(read_text_records([])) == []
+
+
 @patch("corppa.utils.build_text_corpus.get_text_record")
 def test_build_text_corpus(mock_get_text_record, tmp_path):
     corpus_dir = tmp_path / "corpus"
@@ -47,17 +64,46 @@ def test_build_text_corpus(mock_get_text_record, tmp_path):
 
     # Nested directories & ignored files
     mock_get_text_record.reset_mock()
-    mock_get_text_record.side_effect = ["b", "c"]
+    # files are read in separate threads, so base records on the file
+    # rather than call order
+    mock_get_text_record.side_effect = lambda text_file: text_file.stem
     results = build_text_corpus(corpus_dir)
     assert list(results) == ["b", "c"]
     assert mock_get_text_record.call_count == 2
     mock_get_text_record.assert_has_calls([call(txt_b), call(txt_c)])
 
 
+@patch("corppa.utils.build_text_corpus.tqdm")
+def test_build_text_corpus_progress(mock_tqdm, tmp_path):
+    # progress is tracked on records read, not on files found
+    progress_items = []
+
+    def track_progress(iterable, **kwargs):
+        for item in iterable:
+            progress_items.append(item)
+            yield item
+
+    mock_tqdm.side_effect = track_progress
+    (tmp_path / "a.txt").write_text("text", encoding="utf-8")
+    results = list(build_text_corpus(tmp_path))
+    assert results == [{"id": "a", "text": "text"}]
+    assert progress_items == results
+
+
 @patch("corppa.utils.build_text_corpus.build_text_corpus")
-@patch("corppa.utils.build_text_corpus.orjsonl")
-def test_save_text_corpus(mock_orjsonl, mock_build_text_corpus):
-    mock_build_text_corpus.return_value = "text corpus"
-    save_text_corpus("input dir", "output file")
-    mock_build_text_corpus.assert_called_once_with("input dir")
-    mock_orjsonl.save.assert_called_once_with("output file", "text corpus")
+def test_save_text_corpus(mock_build_text_corpus, tmp_path):
+    records = [{"id": "a", "text": "Some\n text."}, {"id": "b", "text": "ünïcode"}]
+    mock_build_text_corpus.side_effect = lambda *args, **kwargs: iter(records)
+
+    output_file = tmp_path / "corpus.jsonl"
+    save_text_corpus("input dir", output_file)
+    mock_build_text_corpus.assert_called_once_with("input dir", disable_progress=False)
+    assert orjsonl.load(output_file) == records
+
+    # compressed output, based on file suffix
+    output_file_gz = tmp_path / "corpus.jsonl.gz"
+    save_text_corpus("input dir", output_file_gz, disable_progress=True)
+    mock_build_text_corpus.assert_called_with("input dir", disable_progress=True)
+    with gzip.open(output_file_gz, "rb") as corpus_file:
+        assert corpus_file.read().startswith(b'{"id":"a"')
+    assert orjsonl.load(output_file_gz) == records